@@ -4,18 +4,15 @@
 #
 # License: GNU General Public License v3.0
 from __future__ import print_function
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, OrderedDict, deque
 import sys
 import warnings
-import copy
 import math
+import inspect
 import numpy as np
-import scipy.sparse
-import scipy.sparse.linalg
-from numba import jit
-import itertools
+from numba import jit, prange, get_num_threads
 
-def _generate_noise(covar_matrix, time=1000, use_inverse=False):
+def _generate_noise(covar_matrix, time=1000, use_inverse=False, rng=None):
     """
     Generate a multivariate normal distribution using correlated innovations.
 
@@ -28,6 +25,9 @@ def _generate_noise(covar_matrix, time=1000, use_inverse=False):
     use_inverse : bool, optional
         Negate the off-diagonal elements and invert the covariance matrix
         before use
+    rng : numpy.random.Generator, optional (default: None)
+        Random number generator to draw from. If None, the global numpy random
+        state is used
 
     Returns
     -------
@@ -36,18 +36,28 @@ def _generate_noise(covar_matrix, time=1000, use_inverse=False):
     """
     # Pull out the number of nodes from the shape of the covar_matrix
     n_nodes = covar_matrix.shape[0]
-    # Make a deep copy for use in the inverse case
+    # Default to the global random state
+    if rng is None:
+        rng = np.random
     this_covar = covar_matrix
     # Take the negative inverse if needed
     if use_inverse:
-        this_covar = copy.deepcopy(covar_matrix)
-        this_covar *= -1
-        this_covar[np.diag_indices_from(this_covar)] *= -1
+        # Negating allocates a new array, so covar_matrix is left untouched
+        this_covar = -covar_matrix
+        np.fill_diagonal(this_covar, np.diag(covar_matrix))
         this_covar = np.linalg.inv(this_covar)
+    # Factor the covariance matrix once and correlate standard normal noise
+    # with it
+    try:
+        cholesky_factor = np.linalg.cholesky(this_covar)
+    except np.linalg.LinAlgError:
+        # The covariance matrix is only positive semi-definite, fall back to
+        # the decomposition done by multivariate_normal
+        return rng.multivariate_normal(mean=np.zeros(n_nodes),
+                                       cov=this_covar,
+                                       size=time)
     # Return the noise distribution
-    return np.random.multivariate_normal(mean=np.zeros(n_nodes),
-                                            cov=this_covar,
-                                            size=time)
+    return rng.standard_normal((time, n_nodes)) @ cholesky_factor.T
 
 def _check_stability(graph):
     """
@@ -61,35 +71,29 @@ def _check_stability(graph):
     """
     # Get the shape from the input graph
     n_nodes, _, period = graph.shape
-    # Set the top section as the horizontally stacked matrix of
-    # shape (n_nodes, n_nodes * period)
-    stability_matrix = \
-        scipy.sparse.hstack([scipy.sparse.lil_matrix(graph[:, :, t_slice])
-                             for t_slice in range(period)])
-    # Extend an identity matrix of shape
-    # (n_nodes * (period - 1), n_nodes * (period - 1)) to shape
-    # (n_nodes * (period - 1), n_nodes * period) and stack the top section on
-    # top to make the stability matrix of shape
-    # (n_nodes * period, n_nodes * period)
-    stability_matrix = \
-        scipy.sparse.vstack([stability_matrix,
-                             scipy.sparse.eye(n_nodes * (period - 1),
-                                              n_nodes * period)])
-    # Check the number of dimensions to see if we can afford to use a dense
-    # matrix
-    n_eigs = stability_matrix.shape[0]
-    if n_eigs <= 25:
-        # If it is relatively low in dimensionality, use a dense array
-        stability_matrix = stability_matrix.todense()
-        eigen_values, _ = scipy.linalg.eig(stability_matrix)
+    # Trailing lags without connections only add zero eigen values, so drop
+    # them. The last lag of _get_lag_connect_matrix is always empty.
+    while period > 1 and not graph[:, :, period - 1].any():
+        period -= 1
+    if period == 1:
+        # With a single lag the stability matrix is the graph itself
+        eigen_values = np.linalg.eigvals(graph[:, :, 0])
     else:
-        # If it is a large dimensionality, convert to a compressed row sorted
-        # matrix, as it may be easier for the linear algebra package
-        stability_matrix = stability_matrix.tocsr()
+        # Build the companion matrix of shape
+        # (n_nodes * period, n_nodes * period)
+        stability_matrix = np.zeros((n_nodes * period, n_nodes * period))
+        # Set the top section as the horizontally stacked matrix of
+        # shape (n_nodes, n_nodes * period)
+        stability_matrix[:n_nodes, :] = \
+            graph[:, :, :period].transpose(0, 2, 1).reshape(n_nodes,
+                                                            n_nodes * period)
+        # Set an identity matrix of shape
+        # (n_nodes * (period - 1), n_nodes * (period - 1)) below it, shifting
+        # each lag block down by one lag
+        stability_matrix[n_nodes:, :-n_nodes] = \
+            np.identity(n_nodes * (period - 1))
         # Get the eigen values of the stability matrix
-        eigen_values = scipy.sparse.linalg.eigs(stability_matrix,
-                                                k=(n_eigs - 2),
-                                                return_eigenvectors=False)
+        eigen_values = np.linalg.eigvals(stability_matrix)
     # Ensure they all have less than one magnitude
     assert np.all(np.abs(eigen_values) < 1.), \
         "Values given by time lagged connectivity matrix corresponds to a "+\
@@ -115,6 +119,80 @@ def _check_initial_values(initial_values, shape):
         "\n current shape : " + str(initial_values.shape)+\
         "\n desired shape : " + str(shape)
 
+@jit(nopython=True, cache=True, fastmath=True)
+def _var_step(graph, data, noise, period, n_nodes, T, add_noise):
+    """
+    Compiled recursion of the vector-autoregressive process. Fills data in
+    place, starting at time index period.
+
+    Parameters
+    ----------
+    graph : array
+        Lagged connectivity matrices in chronological order. Shape is
+        (n_nodes, n_nodes, period), where graph[j, i, k] is the coefficient
+        of data[i, t-period+k]
+    data : array
+        Array of realization of shape (n_nodes, T) with the first period
+        columns holding the initial values
+    noise : array
+        Innovations of shape (T, n_nodes). Only read if add_noise is True
+    period : int
+        Number of lagged connectivity matrices
+    n_nodes : int
+        Number of nodes
+    T : int
+        Sample size
+    add_noise : bool
+        Flag to add the innovations or not
+    """
+    for t in range(period, T):
+        for j in range(n_nodes):
+            acc = noise[t, j] if add_noise else 0.
+            for i in range(n_nodes):
+                for k in range(period):
+                    acc += graph[j, i, k] * data[i, t-period+k]
+            data[j, t] = acc
+
+def _var_recursion(graph, data, noise, add_noise):
+    """
+    Fills data in place with the vector-autoregressive recursion defined by
+    graph, starting at time index graph.shape[2].
+
+    Parameters
+    ----------
+    graph : array
+        Lagged connectivity matrices. Shape is (n_nodes, n_nodes, period)
+    data : array
+        Array of realization of shape (n_nodes, T) with the first period
+        columns holding the initial values
+    noise : array
+        Innovations of shape (T, n_nodes). Only read if add_noise is True
+    add_noise : bool
+        Flag to add the innovations or not
+    """
+    n_nodes, _, period = graph.shape
+    time = data.shape[1]
+    # Reverse the lag axis once, so that each step reads the past values in
+    # their contiguous chronological order
+    graph = np.ascontiguousarray(graph[:, :, ::-1])
+    # Check the size of the system to see if the per-step dispatch overhead
+    # dominates
+    if n_nodes * period <= 200:
+        # If it is relatively small, use the compiled recursion
+        _var_step(graph, data, noise, period, n_nodes, time, add_noise)
+    else:
+        # If it is large, use a BLAS-backed contraction. The contraction path
+        # is the same for every time step, so only compute it once
+        path, _ = np.einsum_path('jik,ik->j', graph,
+                                 np.empty((n_nodes, period)),
+                                 optimize='greedy')
+        for a_time in range(period, time):
+            data[:, a_time] = np.einsum('jik,ik->j', graph,
+                                        data[:, a_time-period:a_time],
+                                        optimize=path)
+            if add_noise:
+                data[:, a_time] += noise[a_time]
+
 def _var_network(graph,
                  add_noise=True,
                  inno_cov=None,
@@ -178,7 +256,7 @@ def _var_network(graph,
         data[:, :period] = initial_values
 
     # Check if we are adding noise
-    noise = None
+    noise = np.empty((0, n_nodes))
     if add_noise:
         # Use inno_cov if it was provided
         if inno_cov is not None:
@@ -189,13 +267,7 @@ def _var_network(graph,
         else:
             noise = np.random.randn(time, n_nodes)
 
-    for a_time in range(period, time):
-        data_past = np.repeat(
-            data[:, a_time-period:a_time][:, ::-1].reshape(1, n_nodes, period),
-            n_nodes, axis=0)
-        data[:, a_time] = (data_past*graph).sum(axis=2).sum(axis=1)
-        if add_noise:
-            data[:, a_time] += noise[a_time]
+    _var_recursion(graph, data, noise, add_noise)
 
     return data.transpose()
 
@@ -224,7 +296,33 @@ def _iter_coeffs(parents_neighbors_coeffs):
             # Yield the entry
             yield node_id, parent_id, time_lag, coeff
 
-def _check_parent_neighbor(parents_neighbors_coeffs):
+def _coeffs_array(parents_neighbors_coeffs):
+    """
+    Collects the relationships of the current parents_neighbors_coeffs
+    structure into a single structured array, so that they can be processed
+    without iterating in python.
+
+    Parameters
+    ----------
+    parents_neighbors_coeffs : dict
+        Dictionary of format:
+        {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
+        all variables where vars must be in [0..N-1] and lags <= 0 with number
+        of variables N.
+
+    Returns
+    -------
+    coeffs : structured array
+        Array with the fields 'node_id', 'parent_id', 'time_lag' and 'coeff',
+        one entry per relationship in the order of _iter_coeffs
+    """
+    return np.fromiter(_iter_coeffs(parents_neighbors_coeffs),
+                       dtype=[('node_id', np.intp),
+                              ('parent_id', np.intp),
+                              ('time_lag', np.intp),
+                              ('coeff', np.float64)])
+
+def _check_parent_neighbor(parents_neighbors_coeffs, coeffs=None):
     """
     Checks to insure input parent-neighbor connectivity input is sane.  This
     means that:
@@ -241,33 +339,28 @@ def _check_parent_neighbor(parents_neighbors_coeffs):
         {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
         all variables where vars must be in [0..N-1] and lags <= 0 with number
         of variables N.
+    coeffs : structured array, optional (default: None)
+        Output of _coeffs_array for parents_neighbors_coeffs, if already built.
     """
-    # Initialize some lists for checking later
-    all_nodes = set()
-    all_parents = set()
-    # Iterate through variables
-    for j in list(parents_neighbors_coeffs):
-        # Cache all node ids to ensure they are contiguous
-        all_nodes.add(j)
-    # Iterate through all nodes
-    for j, i, tau, _ in _iter_coeffs(parents_neighbors_coeffs):
-        # Check all time lags are equal to or less than zero
-        if tau > 0:
-            raise ValueError("Lag between parent {} and node {}".format(i, j)+\
-                             " is {} > 0, must be <= 0!".format(tau))
-        # Cache all parent ids to ensure they are mentioned as node ids
-        all_parents.add(i)
+    if coeffs is None:
+        coeffs = _coeffs_array(parents_neighbors_coeffs)
+    # Check all time lags are equal to or less than zero
+    positive_lags = coeffs[coeffs['time_lag'] > 0]
+    if positive_lags.size:
+        j, i, tau, _ = positive_lags[0].item()
+        raise ValueError("Lag between parent {} and node {}".format(i, j)+\
+                         " is {} > 0, must be <= 0!".format(tau))
     # Check that all nodes are contiguous from zero
-    all_nodes_list = sorted(list(all_nodes))
+    all_nodes_list = sorted(list(parents_neighbors_coeffs))
     if all_nodes_list != list(range(len(all_nodes_list))):
         raise ValueError("Node IDs in input dictionary must be contiguous"+\
                          " and start from zero!\n"+\
                          " Found IDs : [" +\
                          ",".join(map(str, all_nodes_list))+ "]")
     # Check that all parent nodes are mentioned as a node ID
-    if not all_parents.issubset(all_nodes):
-        missing_nodes = sorted(list(all_parents - all_nodes))
-        all_parents_list = sorted(list(all_parents))
+    missing_nodes = np.setdiff1d(coeffs['parent_id'], all_nodes_list)
+    if missing_nodes.size:
+        all_parents_list = np.unique(coeffs['parent_id'])
         raise ValueError("Parent IDs in input dictionary must also be in set"+\
                          " of node IDs."+\
                          "\n Parent IDs "+" ".join(map(str, all_parents_list))+\
@@ -289,25 +382,21 @@ def _check_symmetric_relations(a_matrix):
     """
     # Check it is symmetric
     if not np.allclose(a_matrix, a_matrix.T, rtol=1e-10, atol=1e-10):
-        # Store the disagreement elements
+        # Store the disagreement elements. The disagreement is symmetric, so
+        # only report each pair once from the upper triangle
         bad_elems = ~np.isclose(a_matrix, a_matrix.T, rtol=1e-10, atol=1e-10)
-        bad_idxs = np.argwhere(bad_elems)
+        bad_idxs = np.argwhere(np.triu(bad_elems, k=1))
         error_message = ""
         for node, parent in bad_idxs:
-            # Check that we haven't already printed about this pair
-            if bad_elems[node, parent]:
-                error_message += \
-                    "Parent {:d} of node {:d}".format(parent, node)+\
-                    " has coefficient {:f}.\n".format(a_matrix[node, parent])+\
-                    "Parent {:d} of node {:d}".format(node, parent)+\
-                    " has coefficient {:f}.\n".format(a_matrix[parent, node])
-            # Check if we already printed about this one
-            bad_elems[node, parent] = False
-            bad_elems[parent, node] = False
+            error_message += \
+                "Parent {:d} of node {:d}".format(parent, node)+\
+                " has coefficient {:f}.\n".format(a_matrix[node, parent])+\
+                "Parent {:d} of node {:d}".format(node, parent)+\
+                " has coefficient {:f}.\n".format(a_matrix[parent, node])
         raise ValueError("Relationships between nodes at tau=0 are not"+\
                          " symmetric!\n"+error_message)
 
-def _find_max_time_lag_and_node_id(parents_neighbors_coeffs):
+def _find_max_time_lag_and_node_id(parents_neighbors_coeffs, coeffs=None):
     """
     Function to find the maximum time lag in the parent-neighbors-coefficients
     object, as well as the largest node ID
@@ -319,25 +408,24 @@ def _find_max_time_lag_and_node_id(parents_neighbors_coeffs):
         {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
         all variables where vars must be in [0..N-1] and lags <= 0 with number
         of variables N.
+    coeffs : structured array, optional (default: None)
+        Output of _coeffs_array for parents_neighbors_coeffs, if already built.
 
     Returns
     -------
     (max_time_lag, max_node_id) : tuple
         Tuple of the maximum time lag and maximum node ID
     """
-    # Default maximum lag and node ID
-    max_time_lag = 0
+    if coeffs is None:
+        coeffs = _coeffs_array(parents_neighbors_coeffs)
+    # Find max lag time, defaulting to zero
+    max_time_lag = int(np.abs(coeffs['time_lag']).max(initial=0))
+    # Find the max node ID
     max_node_id = len(parents_neighbors_coeffs.keys()) - 1
-    # Iterate through the keys in parents_neighbors_coeffs
-    for j, _, tau, _ in _iter_coeffs(parents_neighbors_coeffs):
-        # Find max lag time
-        max_time_lag = max(max_time_lag, abs(tau))
-        # Find the max node ID
-        # max_node_id = max(max_node_id, j)
     # Return these values
     return max_time_lag, max_node_id
 
-def _get_true_parent_neighbor_dict(parents_neighbors_coeffs):
+def _get_true_parent_neighbor_dict(parents_neighbors_coeffs, coeffs=None):
     """
     Function to return the dictionary of true parent neighbor causal
     connections in time.
@@ -349,6 +437,8 @@ def _get_true_parent_neighbor_dict(parents_neighbors_coeffs):
         {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
         all variables where vars must be in [0..N-1] and lags <= 0 with number
         of variables N.
+    coeffs : structured array, optional (default: None)
+        Output of _coeffs_array for parents_neighbors_coeffs, if already built.
 
     Returns
     -------
@@ -356,19 +446,20 @@ def _get_true_parent_neighbor_dict(parents_neighbors_coeffs):
         Dictionary of lists of tuples.  The dictionary is keyed by node ID, the
         list stores the tuple values (parent_node_id, time_lag)
     """
+    if coeffs is None:
+        coeffs = _coeffs_array(parents_neighbors_coeffs)
     # Initialize the returned dictionary of lists
     true_parents_neighbors = defaultdict(list)
-    for j in parents_neighbors_coeffs:
-        for link_props in parents_neighbors_coeffs[j]:
-            i, tau = link_props[0]
-            coeff = link_props[1]
-            # Add parent node id and lag if non-zero coeff
-            if coeff != 0.:
-                true_parents_neighbors[j].append((i, tau))
+    # Add parent node id and lag if non-zero coeff
+    coeffs = coeffs[coeffs['coeff'] != 0.]
+    for j, i, tau in zip(coeffs['node_id'].tolist(),
+                         coeffs['parent_id'].tolist(),
+                         coeffs['time_lag'].tolist()):
+        true_parents_neighbors[j].append((i, tau))
     # Return the true relations
     return true_parents_neighbors
 
-def _get_covariance_matrix(parents_neighbors_coeffs):
+def _get_covariance_matrix(parents_neighbors_coeffs, coeffs=None):
     """
     Determines the covariance matrix for correlated innovations
 
@@ -379,6 +470,8 @@ def _get_covariance_matrix(parents_neighbors_coeffs):
         {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
         all variables where vars must be in [0..N-1] and lags <= 0 with number
         of variables N.
+    coeffs : structured array, optional (default: None)
+        Output of _coeffs_array for parents_neighbors_coeffs, if already built.
 
     Returns
     -------
@@ -386,20 +479,20 @@ def _get_covariance_matrix(parents_neighbors_coeffs):
         Covariance matrix implied by the parents_neighbors_coeffs.  Used to
         generate correlated innovations.
     """
+    if coeffs is None:
+        coeffs = _coeffs_array(parents_neighbors_coeffs)
     # Get the total number of nodes
     _, max_node_id = \
-            _find_max_time_lag_and_node_id(parents_neighbors_coeffs)
+            _find_max_time_lag_and_node_id(parents_neighbors_coeffs, coeffs)
     n_nodes = max_node_id + 1
     # Initialize the covariance matrix
     covar_matrix = np.identity(n_nodes)
-    # Iterate through all the node connections
-    for j, i, tau, coeff in _iter_coeffs(parents_neighbors_coeffs):
-        # Add to covar_matrix if node connection is instantaneous
-        if tau == 0:
-            covar_matrix[j, i] = coeff
+    # Add all instantaneous node connections to covar_matrix
+    coeffs = coeffs[coeffs['time_lag'] == 0]
+    covar_matrix[coeffs['node_id'], coeffs['parent_id']] = coeffs['coeff']
     return covar_matrix
 
-def _get_lag_connect_matrix(parents_neighbors_coeffs):
+def _get_lag_connect_matrix(parents_neighbors_coeffs, coeffs=None):
     """
     Generates the lagged connectivity matrix from a parent-neighbor
     connectivity dictionary.  Used to generate the input for _var_network
@@ -411,26 +504,57 @@ def _get_lag_connect_matrix(parents_neighbors_coeffs):
         {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
         all variables where vars must be in [0..N-1] and lags <= 0 with number
         of variables N.
+    coeffs : structured array, optional (default: None)
+        Output of _coeffs_array for parents_neighbors_coeffs, if already built.
 
     Returns
     -------
     connect_matrix : numpy array
         Lagged connectivity matrix. Shape is (n_nodes, n_nodes, max_delay+1)
     """
+    if coeffs is None:
+        coeffs = _coeffs_array(parents_neighbors_coeffs)
     # Get the total number of nodes and time lag
     max_time_lag, max_node_id = \
-            _find_max_time_lag_and_node_id(parents_neighbors_coeffs)
+            _find_max_time_lag_and_node_id(parents_neighbors_coeffs, coeffs)
     n_nodes = max_node_id + 1
     n_times = max_time_lag + 1
     # Initialize full time graph
     connect_matrix = np.zeros((n_nodes, n_nodes, n_times))
-    for j, i, tau, coeff in _iter_coeffs(parents_neighbors_coeffs):
-        # If there is a non-zero time lag, add the connection to the matrix
-        if tau != 0:
-            connect_matrix[j, i, -(tau+1)] = coeff
+    # Add all connections with a non-zero time lag to the matrix
+    coeffs = coeffs[coeffs['time_lag'] != 0]
+    connect_matrix[coeffs['node_id'], coeffs['parent_id'],
+                   -(coeffs['time_lag']+1)] = coeffs['coeff']
     # Return the connectivity matrix
     return connect_matrix
 
+def _parse_parents_neighbors_coeffs(parents_neighbors_coeffs):
+    """
+    Checks the parent-neighbor connectivity input and derives everything
+    var_process needs from it, collecting the relationships only once.
+
+    Parameters
+    ----------
+    parents_neighbors_coeffs : dict
+        Dictionary of format:
+        {..., j:[((var1, lag1), coef1), ((var2, lag2), coef2), ...], ...} for
+        all variables where vars must be in [0..N-1] and lags <= 0 with number
+        of variables N.
+
+    Returns
+    -------
+    (true_parents_neighbors, covar_matrix, connect_matrix) : tuple
+        Outputs of _get_true_parent_neighbor_dict, _get_covariance_matrix and
+        _get_lag_connect_matrix respectively
+    """
+    coeffs = _coeffs_array(parents_neighbors_coeffs)
+    _check_parent_neighbor(parents_neighbors_coeffs, coeffs)
+    true_parents_neighbors = \
+        _get_true_parent_neighbor_dict(parents_neighbors_coeffs, coeffs)
+    covar_matrix = _get_covariance_matrix(parents_neighbors_coeffs, coeffs)
+    connect_matrix = _get_lag_connect_matrix(parents_neighbors_coeffs, coeffs)
+    return true_parents_neighbors, covar_matrix, connect_matrix
+
 def var_process(parents_neighbors_coeffs, T=1000, use='inv_inno_cov',
                 verbosity=0, initial_values=None):
     """Returns a vector-autoregressive process with correlated innovations.
@@ -465,15 +589,11 @@ def var_process(parents_neighbors_coeffs, T=1000, use='inv_inno_cov',
         Dictionary of lists of tuples.  The dictionary is keyed by node ID, the
         list stores the tuple values (parent_node_id, time_lag)
     """
-    # Check the input parents_neighbors_coeffs dictionary for sanity
-    _check_parent_neighbor(parents_neighbors_coeffs)
-    # Generate the true parent neighbors graph
-    true_parents_neighbors = \
-        _get_true_parent_neighbor_dict(parents_neighbors_coeffs)
-    # Generate the correlated innovations
-    innos = _get_covariance_matrix(parents_neighbors_coeffs)
-    # Generate the lagged connectivity matrix for _var_network
-    connect_matrix = _get_lag_connect_matrix(parents_neighbors_coeffs)
+    # Check the input parents_neighbors_coeffs dictionary for sanity and
+    # generate the true parent neighbors graph, the correlated innovations
+    # and the lagged connectivity matrix for _var_network
+    true_parents_neighbors, innos, connect_matrix = \
+        _parse_parents_neighbors_coeffs(parents_neighbors_coeffs)
     # Default values as per 'inno_cov'
     add_noise = True
     invert_inno = False
@@ -507,6 +627,79 @@ def var_process(parents_neighbors_coeffs, T=1000, use='inv_inno_cov',
     # Return the data
     return data, true_parents_neighbors
 
+def _edges_to_csr(N, edges):
+    """
+    Returns the children of the nodes 0..N-1 in compressed sparse row form.
+
+    Parameters
+    ----------
+    N : int
+        Number of nodes.
+    edges : list
+        List of (u, v) tuples for the edges u -> v.
+
+    Returns
+    -------
+    (offsets, children) : tuple
+        int32 arrays such that the children of node u are
+        children[offsets[u]:offsets[u+1]], in the order of edges.
+    """
+    edges = np.array(edges, dtype=np.int32).reshape(-1, 2)
+    offsets = np.zeros(N + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum(np.bincount(edges[:, 0], minlength=N))
+    children = edges[np.argsort(edges[:, 0], kind='stable'), 1]
+    return offsets, children
+
+def _kahn_toposort(offsets, children):
+    """
+    Returns a topological order of a graph given in the form of
+    _edges_to_csr using Kahn's algorithm, which also detects cycles in the
+    same pass.
+
+    Parameters
+    ----------
+    offsets, children : arrays
+        Graph in compressed sparse row form, see _edges_to_csr.
+
+    Returns
+    -------
+    order : list
+        Nodes such that every edge points from an earlier to a later node.
+    """
+    N = len(offsets) - 1
+    in_degree = np.bincount(children, minlength=N).astype(np.int32)
+    offsets, children = offsets.tolist(), children.tolist()
+    queue = deque(np.flatnonzero(in_degree == 0).tolist())
+    order = []
+    while queue:
+        u = queue.popleft()
+        order.append(u)
+        for v in children[offsets[u]:offsets[u+1]]:
+            in_degree[v] -= 1
+            if in_degree[v] == 0:
+                queue.append(v)
+    # Nodes on a cycle never reach zero in-degree
+    if len(order) < N:
+        raise ValueError("Contemporaneous links must not contain cycle.")
+    return order
+
+def _toposort_levels(offsets, children):
+    """
+    Returns the nodes of a graph given in the form of _edges_to_csr grouped
+    by their depth, so that no node depends on a node of the same level.
+    Raises a ValueError if the graph is cyclic.
+    """
+    order = _kahn_toposort(offsets, children)
+    offsets, children = offsets.tolist(), children.tolist()
+    depth = [0] * (len(offsets) - 1)
+    for u in order:
+        for v in children[offsets[u]:offsets[u+1]]:
+            depth[v] = max(depth[v], depth[u] + 1)
+    levels = [[] for _ in range(max(depth, default=0) + 1)]
+    for u in order:
+        levels[depth[u]].append(u)
+    return levels
+
 class _Graph():
     r"""Helper class to handle graph properties.
 
@@ -516,71 +709,154 @@ class _Graph():
         List of nodes.
     """
     def __init__(self,vertices): 
-        self.graph = defaultdict(list) 
+        self.edges = []
         self.V = vertices 
   
     def addEdge(self,u,v):
         """Adding edge to graph."""
-        self.graph[u].append(v) 
-  
-    def isCyclicUtil(self, v, visited, recStack): 
-        """Utility function to return whether graph is cyclic."""
-        # Mark current node as visited and
-        # adds to recursion stack 
-        visited[v] = True
-        recStack[v] = True
-  
-        # Recur for all neighbours 
-        # if any neighbour is visited and in  
-        # recStack then graph is cyclic 
-        for neighbour in self.graph[v]: 
-            if visited[neighbour] == False: 
-                if self.isCyclicUtil(neighbour, visited, recStack) == True: 
-                    return True
-            elif recStack[neighbour] == True: 
-                return True
-  
-        # The node needs to be poped from  
-        # recursion stack before function ends 
-        recStack[v] = False
-        return False
-  
+        self.edges.append((u, v))
+
+    def csr(self):
+        """Returns the children of each node as (offsets, children), see
+        _edges_to_csr."""
+        return _edges_to_csr(self.V, self.edges)
+
+    def kahn(self):
+        """Returns a topological order of the nodes using Kahn's algorithm,
+        or None if the graph is cyclic."""
+        try:
+            return _kahn_toposort(*self.csr())
+        except ValueError:
+            return None
+
     def isCyclic(self):
         """Returns whether graph is cyclic."""
-        visited = [False] * self.V 
-        recStack = [False] * self.V 
-        for node in range(self.V): 
-            if visited[node] == False: 
-                if self.isCyclicUtil(node,visited,recStack) == True: 
-                    return True
-        return False
-  
-    def topologicalSortUtil(self,v,visited,stack):
-        """A recursive function used by topologicalSort ."""
-        # Mark the current node as visited.
-        visited[v] = True
+        return self.kahn() is None
 
-        # Recur for all the vertices adjacent to this vertex
-        for i in self.graph[v]:
-            if visited[i] == False:
-                self.topologicalSortUtil(i,visited,stack)
+    def topologicalSort(self):
+        """A sorting function. Returns None if the graph is cyclic."""
+        return self.kahn()
+
+    def levels(self):
+        """Returns the nodes grouped by their depth in the graph, so that no
+        node depends on a node of the same level, or None if the graph is
+        cyclic."""
+        try:
+            return _toposort_levels(*self.csr())
+        except ValueError:
+            return None
+
+def _is_vectorized(func):
+    """Returns whether func can be applied element-wise to a whole array."""
+    probe = np.array([-2.5, -0.5, 0., 1., 3.75])
+    try:
+        with np.errstate(all='ignore'):
+            values = np.asarray(func(probe), dtype=np.float64)
+            return bool(values.shape == probe.shape and
+                        np.allclose(values, [func(x) for x in probe],
+                                    equal_nan=True))
+    except Exception:
+        return False
 
-        # Push current vertex to stack which stores result
-        stack.insert(0,v)
+def _identity(x):
+    return x
 
-    def topologicalSort(self):
-        """A sorting function. """
-        # Mark all the vertices as not visited 
-        visited = [False]*self.V 
-        stack =[] 
+def _is_exact_identity(func):
+    """Returns whether func is a plain python function with the code of
+    `def f(x): return x`, without defaults or closure. The function is not
+    called, so one that agrees with x only on some values is never mistaken
+    for the identity."""
+    code = getattr(func, '__code__', None)
+    if not inspect.isfunction(func) or code is None:
+        return False
+    return (code.co_code == _identity.__code__.co_code
+            and code.co_argcount == 1
+            and code.co_kwonlyargcount == 0
+            and not code.co_flags & (inspect.CO_VARARGS
+                                     | inspect.CO_VARKEYWORDS)
+            and func.__defaults__ is None
+            and func.__kwdefaults__ is None
+            and func.__closure__ is None)
+
+# Ids of the link functions that the compiled simulator can evaluate, the
+# identity (id 0) is detected with _is_exact_identity
+_FUNC_IDS = {np.tanh: 1, math.tanh: 1, np.square: 2}
+
+def _get_func_id(func):
+    """Returns the id of func for the compiled simulator, -1 if unknown."""
+    try:
+        func_id = _FUNC_IDS.get(func)
+    except TypeError:
+        # Unhashable callable
+        func_id = None
+    if func_id is None:
+        func_id = 0 if _is_exact_identity(func) else -1
+    return func_id
+
+@jit(nopython=True, cache=True)
+def _scp_node(data, t, j, offsets, parents, lags, coeffs, func_ids,
+              hard_mask, soft_mask, intervention_values):
+    """Computes node j at time t for _scp_step and _scp_step_parallel."""
+    if hard_mask[t, j]:
+        data[t, j] = intervention_values[t, j]
+        return
+    if soft_mask[t, j]:
+        data[t, j] += intervention_values[t, j]
+    for k in range(offsets[j], offsets[j+1]):
+        value = data[t + lags[k], parents[k]]
+        if func_ids[k] == 1:
+            value = math.tanh(value)
+        elif func_ids[k] == 2:
+            value = value * value
+        data[t, j] += coeffs[k] * value
+
+@jit(nopython=True, cache=True)
+def _scp_step(data, max_lag, causal_order, offsets, parents, lags, coeffs,
+              func_ids, hard_mask, soft_mask, intervention_values):
+    """
+    Compiled time loop of structural_causal_process for links with known
+    functions. Adds the link contributions to data in place, starting at time
+    index max_lag.
 
-        # Call the recursive helper function to store Topological 
-        # Sort starting from all vertices one by one 
-        for i in range(self.V): 
-          if visited[i] == False: 
-              self.topologicalSortUtil(i,visited,stack) 
+    Parameters
+    ----------
+    data : array
+        Noise of shape (T, N), overwritten with the realization
+    max_lag : int
+        Maximum lag of the links
+    causal_order : array
+        Order in which to compute the nodes at each time step
+    offsets : array
+        The links of node j are stored at positions offsets[j] to
+        offsets[j+1] of the following arrays
+    parents, lags, coeffs, func_ids : arrays
+        Parent node, lag, coefficient and func id of each link
+    hard_mask, soft_mask : arrays
+        Boolean arrays of shape (T, N) marking hard and soft interventions
+    intervention_values : array
+        Interventional values of shape (T, N)
+    """
+    for t in range(max_lag, data.shape[0]):
+        for j in causal_order:
+            _scp_node(data, t, j, offsets, parents, lags, coeffs, func_ids,
+                      hard_mask, soft_mask, intervention_values)
 
-        return stack
+@jit(nopython=True, parallel=True, cache=True)
+def _scp_step_parallel(data, max_lag, level_offsets, level_nodes, offsets,
+                       parents, lags, coeffs, func_ids, hard_mask, soft_mask,
+                       intervention_values):
+    """
+    Variant of _scp_step that computes the nodes of each level of the
+    contemporaneous graph in parallel. The nodes of level l are
+    level_nodes[level_offsets[l]:level_offsets[l+1]], the remaining
+    parameters are as in _scp_step.
+    """
+    for t in range(max_lag, data.shape[0]):
+        for level in range(len(level_offsets) - 1):
+            for idx in prange(level_offsets[level], level_offsets[level+1]):
+                _scp_node(data, t, level_nodes[idx], offsets, parents, lags,
+                          coeffs, func_ids, hard_mask, soft_mask,
+                          intervention_values)
 
 def structural_causal_process(links, T, noises=None, 
                         intervention=None, intervention_type='hard',
@@ -667,11 +943,10 @@ def structural_causal_process(links, T, noises=None,
             if var != j and lag == 0:
                 contemp_dag.addEdge(var, j)
 
-    if contemp_dag.isCyclic() == 1: 
+    causal_order = contemp_dag.kahn()
+    if causal_order is None:
         raise ValueError("Contemporaneous links must not contain cycle.")
 
-    causal_order = contemp_dag.topologicalSort() 
-
     if intervention is not None:
         if intervention_type is None:
             intervention_type = {j:'hard' for j in intervention}
@@ -685,28 +960,137 @@ def structural_causal_process(links, T, noises=None,
 
     transient = int(math.floor(.2*T))
 
-    data = np.zeros((T+transient, N), dtype='float32')
+    data = np.empty((T+transient, N), dtype=np.float64)
+    if all(noise == random_state.randn for noise in noises):
+        # Draw the default noise of all nodes with a single call. Drawing it
+        # node by node along the first axis gives the same values as calling
+        # noises[j] for each node.
+        data[:] = random_state.standard_normal((N, T+transient)).T
+    else:
+        for j in range(N):
+            data[:, j] = noises[j](T+transient)
+
+    # Unpack the links of each node into arrays of parents, lags, coeffs and
+    # funcs once, so that the time loop is free of tuple unpacking
+    parents_arr = {}
+    lags_arr = {}
+    coeffs_arr = {}
+    funcs_arr = {}
+    # Contemporaneous self-links read the partially updated value, so these
+    # nodes have their links applied one after the other in place
+    self_contemp = {}
+    # Nodes with many links that are all linear are updated with a single dot
+    # product, for a handful of links the scalar loop is cheaper
+    linear = {}
     for j in range(N):
-        data[:, j] = noises[j](T+transient)
-
-    for t in range(max_lag, T+transient):
-        for j in causal_order:
-
-            if (intervention is not None and j in intervention and t >= transient
-                and np.isnan(intervention[j][t - transient]) == False):
-                if intervention_type[j] == 'hard':
-                    data[t, j] = intervention[j][t - transient]
-                    # Move to next j and skip link_props-loop from parents below 
-                    continue
+        parents_arr[j] = np.array([link_props[0][0] for link_props in links[j]],
+                                  dtype=np.intp)
+        lags_arr[j] = np.array([link_props[0][1] for link_props in links[j]],
+                               dtype=np.intp)
+        coeffs_arr[j] = np.array([link_props[1] for link_props in links[j]],
+                                 dtype=data.dtype)
+        funcs_arr[j] = tuple(link_props[2] for link_props in links[j])
+        self_contemp[j] = (j, 0) in [link_props[0] for link_props in links[j]]
+        linear[j] = (len(links[j]) > 8 and not self_contemp[j]
+                     and all(_is_exact_identity(func) for func in funcs_arr[j]))
+    # Python scalars for the scalar loop, indexing numpy arrays is slower
+    links_unpacked = {j: tuple(zip(parents_arr[j].tolist(), lags_arr[j].tolist(),
+                                   coeffs_arr[j].tolist(), funcs_arr[j]))
+                      for j in range(N)}
+
+    # Smallest lag of the lagged links, which bounds the number of time steps
+    # that can be computed at once
+    lagged = [abs(lag) for j in range(N) for lag in lags_arr[j].tolist()
+              if lag != 0]
+    block_size = min(lagged) if lagged else T + transient
+
+    # Align the interventions with the time axis of data once, so that the
+    # time loop only looks up boolean masks
+    hard_mask = np.zeros((T+transient, N), dtype=bool)
+    soft_mask = np.zeros((T+transient, N), dtype=bool)
+    intervention_values = np.zeros((T+transient, N))
+    intervened = [False] * N
+    if intervention is not None:
+        for j in intervention:
+            values = np.asarray(intervention[j], dtype=np.float64)
+            mask = hard_mask if intervention_type[j] == 'hard' else soft_mask
+            mask[transient:, j] = ~np.isnan(values)
+            intervention_values[transient:, j] = np.nan_to_num(values)
+            intervened[j] = True
+
+    # Ids of the funcs of all links for the compiled loop, -1 if unknown
+    func_ids = np.array([_get_func_id(func) for j in range(N)
+                         for func in funcs_arr[j]], dtype=np.int8)
+
+    # With only known funcs use the compiled loop over the links of all
+    # nodes, stored back to back
+    if np.all(func_ids >= 0):
+        link_arrays = (np.cumsum([0] + [len(links[j]) for j in range(N)]),
+                       np.concatenate([parents_arr[j] for j in range(N)]),
+                       np.concatenate([lags_arr[j] for j in range(N)]),
+                       np.concatenate([coeffs_arr[j] for j in range(N)]),
+                       func_ids, hard_mask, soft_mask, intervention_values)
+        # Nodes of the same level of the contemporaneous graph can be
+        # computed in parallel. Every level starts a parallel region at each
+        # time step, which only pays off for wide levels.
+        levels = contemp_dag.levels()
+        if (get_num_threads() > 1
+                and max(len(level) for level in levels) >= 256):
+            _scp_step_parallel(data, max_lag,
+                               np.cumsum([0] + [len(level) for level in levels]),
+                               np.array([j for level in levels for j in level],
+                                        dtype=np.intp),
+                               *link_arrays)
+        else:
+            _scp_step(data, max_lag, np.array(causal_order, dtype=np.intp),
+                      *link_arrays)
+    # Values within block_size time steps do not depend on each other through
+    # lagged links, and the contemporaneous links are resolved by the causal
+    # order. If all funcs are element-wise, every link can then be applied to
+    # a whole block of time steps at once. For short blocks the slicing
+    # overhead outweighs this.
+    elif (block_size > 4 and all(_is_vectorized(func) for j in range(N)
+                                 for func in funcs_arr[j])):
+        for t_start in range(max_lag, T+transient, block_size):
+            block = slice(t_start, min(t_start + block_size, T+transient))
+            for j in causal_order:
+                if intervened[j]:
+                    soft = soft_mask[block, j]
+                    data[block, j][soft] += intervention_values[block, j][soft]
+                for var, lag, coeff, func in links_unpacked[j]:
+                    data[block, j] += coeff * func(
+                        data[block.start+lag:block.stop+lag, var])
+                # Hard interventions overwrite the values computed from the
+                # links before any child reads them
+                if intervened[j]:
+                    hard = hard_mask[block, j]
+                    data[block, j][hard] = intervention_values[block, j][hard]
+    else:
+        # Resolve the per-node lookups once instead of at every time step
+        ordered_nodes = tuple((j, intervened[j], linear[j], self_contemp[j],
+                               links_unpacked[j]) for j in causal_order)
+        for t in range(max_lag, T+transient):
+            for j, j_intervened, j_linear, j_self_contemp, j_links in ordered_nodes:
+
+                if j_intervened:
+                    if hard_mask[t, j]:
+                        data[t, j] = intervention_values[t, j]
+                        # Move to next j and skip link_props-loop from parents below 
+                        continue
+                    elif soft_mask[t, j]:
+                        data[t, j] += intervention_values[t, j]
+
+                # This part is only reached if intervention_type != 'hard'
+                if j_linear:
+                    data[t, j] += coeffs_arr[j] @ data[t + lags_arr[j], parents_arr[j]]
+                elif j_self_contemp:
+                    for var, lag, coeff, func in j_links:
+                        data[t, j] += coeff * func(data[t + lag, var])
                 else:
-                    data[t, j] += intervention[j][t - transient]
-
-            # This loop is only entered if intervention_type != 'hard'
-            for link_props in links[j]:
-                var, lag = link_props[0]
-                coeff = link_props[1]
-                func = link_props[2]
-                data[t, j] += coeff * func(data[t + lag, var])
+                    value = data[t, j]
+                    for var, lag, coeff, func in j_links:
+                        value += coeff * func(data[t + lag, var])
+                    data[t, j] = value
 
     data = data[transient:]
 
@@ -714,10 +1098,183 @@ def structural_causal_process(links, T, noises=None,
 
     return data, nonstationary
 
+@jit(nopython=True, cache=True)
+def _sample_dbn_node(data, t, j, max_lag, n_cat, init_cum, init_offsets,
+                     cpm_cum, cpm_offsets, cpm_widths, offsets, parents, lags,
+                     row_strides, U):
+    """Samples node j at time t for _sample_dbn and _sample_dbn_parallel."""
+    if data[t, j] != -1:
+        raise ValueError("Causal order not traversed")
+    if t < max_lag:
+        cum = init_cum
+        idx = init_offsets[j]
+        width = n_cat[j]
+    else:
+        cum = cpm_cum
+        width = cpm_widths[j]
+        row = 0
+        for k in range(offsets[j], offsets[j+1]):
+            row += data[t + lags[k], parents[k]] * row_strides[k]
+        idx = cpm_offsets[j] + row * width
+    # As in multinomial, the last category takes the remaining probability
+    # mass, so it is left out of the search
+    data[t, j] = np.searchsorted(cum[idx:idx + width - 1], U[t, j],
+                                 side='right')
+
+@jit(nopython=True, cache=True)
+def _sample_dbn(data, max_lag, causal_order, n_cat, init_cum, init_offsets,
+                cpm_cum, cpm_offsets, cpm_widths, offsets, parents, lags,
+                row_strides, U):
+    """
+    Compiled sampling loop of the DBN processes. Draws each category by
+    a binary search of the cumulative probabilities for a uniform random
+    number.
+
+    Parameters
+    ----------
+    data : array
+        Integer array of shape (T, N) filled with -1, overwritten with the
+        sampled categories
+    max_lag : int
+        Maximum lag of the links, the first max_lag time steps are drawn from
+        the initial probabilities
+    causal_order : array
+        Order in which to sample the nodes at each time step
+    n_cat : array
+        Number of categories of each node
+    init_cum, init_offsets : arrays
+        Cumulative initial probabilities of node j are
+        init_cum[init_offsets[j]:init_offsets[j] + n_cat[j]]
+    cpm_cum, cpm_offsets, cpm_widths : arrays
+        Conditional probability matrix of node j with one row of
+        cpm_widths[j] entries per parent configuration, cumulated over the
+        categories of j and flattened, starts at cpm_offsets[j]
+    offsets : array
+        The parents of node j are stored at positions offsets[j] to
+        offsets[j+1] of the following arrays
+    parents, lags, row_strides : arrays
+        Parent node, lag and row stride in the CPM of each parent
+    U : array
+        Uniform random numbers of shape (T, N)
+    """
+    for t in range(data.shape[0]):
+        for j in causal_order:
+            _sample_dbn_node(data, t, j, max_lag, n_cat, init_cum,
+                             init_offsets, cpm_cum, cpm_offsets, cpm_widths,
+                             offsets, parents, lags, row_strides, U)
+    return data
+
+@jit(nopython=True, parallel=True, cache=True)
+def _sample_dbn_parallel(data, max_lag, level_offsets, level_nodes, n_cat,
+                         init_cum, init_offsets, cpm_cum, cpm_offsets,
+                         cpm_widths, offsets, parents, lags, row_strides, U):
+    """
+    Variant of _sample_dbn that samples the nodes of each level of the
+    contemporaneous graph in parallel. The nodes of level l are
+    level_nodes[level_offsets[l]:level_offsets[l+1]], the remaining
+    parameters are as in _sample_dbn.
+    """
+    for t in range(data.shape[0]):
+        for level in range(len(level_offsets) - 1):
+            for idx in prange(level_offsets[level], level_offsets[level+1]):
+                _sample_dbn_node(data, t, level_nodes[idx], max_lag, n_cat,
+                                 init_cum, init_offsets, cpm_cum, cpm_offsets,
+                                 cpm_widths, offsets, parents, lags,
+                                 row_strides, U)
+    return data
+
+def _sample_dbn_roots(data, max_lag, causal_order, n_cat, init_cum,
+                      init_offsets, cpm_cum, cpm_offsets, cpm_widths, offsets,
+                      parents, lags, row_strides, U):
+    """
+    Samples the nodes without parents, whose draws are independent over
+    time, for all time steps at once. Takes the same parameters as
+    _sample_dbn and returns the causal order of the remaining nodes.
+    """
+    is_root = offsets[causal_order + 1] == offsets[causal_order]
+    for j in causal_order[is_root]:
+        # The last category takes the remaining probability mass
+        init = init_cum[init_offsets[j]:init_offsets[j] + n_cat[j] - 1]
+        data[:max_lag, j] = np.searchsorted(init, U[:max_lag, j], side='right')
+        cpm = cpm_cum[cpm_offsets[j]:cpm_offsets[j] + cpm_widths[j] - 1]
+        data[max_lag:, j] = np.searchsorted(cpm, U[max_lag:, j], side='right')
+    return causal_order[~is_root]
+
+def _cpm_to_rows(cpm):
+    """
+    Returns the conditional probability matrix cpm of shape
+    [n_cat_var1, n_cat_var2,..., n_cat_j] as a 2D array with one row per
+    parent configuration, together with the row stride of each parent.
+    """
+    shape = cpm.shape
+    row_strides = [int(np.prod(shape[k+1:-1])) for k in range(len(shape) - 1)]
+    return cpm.reshape(-1, shape[-1]), row_strides
+
+def _pack_dbn_tables(prob, parents_order, row_strides, n_cat):
+    """
+    Collects the cumulative probabilities and parents of the DBN processes
+    into the flat arrays used by _sample_dbn.
+
+    Parameters
+    ----------
+    prob : array
+        Object array of shape (2, N) with the initial probabilities and the
+        2D conditional probability matrices of each node, as returned by
+        _cpm_to_rows
+    parents_order : dict
+        Dictionary of lists of (lag, var) tuples for each node, in the order
+        of the parent axes of its conditional probability matrix
+    row_strides : dict
+        Dictionary of the row strides of the parents of each node, as
+        returned by _cpm_to_rows
+    n_cat : array
+        Number of categories of each node
+
+    Returns
+    -------
+    (init_cum, init_offsets, cpm_cum, cpm_offsets, cpm_widths, offsets,
+    parents, lags, row_strides) : tuple
+        Inputs of _sample_dbn
+    """
+    N = len(n_cat)
+    init_cum = np.concatenate([np.cumsum(prob[0, j], dtype=np.float64)
+                               for j in range(N)])
+    init_offsets = np.zeros(N, dtype=np.intp)
+    init_offsets[1:] = np.cumsum(n_cat)[:-1]
+    # Cumulate each conditional distribution once instead of per draw
+    cpms = [np.cumsum(prob[1, j], axis=-1, dtype=np.float64)
+            for j in range(N)]
+    cpm_cum = np.concatenate([cpm.ravel() for cpm in cpms])
+    cpm_offsets = np.zeros(N, dtype=np.intp)
+    cpm_offsets[1:] = np.cumsum([cpm.size for cpm in cpms])[:-1]
+    # The rows of a CPM can have more or fewer entries than the categories of
+    # its node (gen_cpt uses n_symbs), so every node can take values up to
+    # the larger of the two. Check that these stay within the CPMs of its
+    # children, since _sample_dbn does not check bounds
+    cpm_widths = np.array([cpm.shape[-1] for cpm in cpms], dtype=np.intp)
+    n_values = np.maximum(n_cat, cpm_widths)
+    for j in range(N):
+        n_rows = cpms[j].shape[0]
+        for k, (lag, var) in enumerate(parents_order[j]):
+            size = (n_rows if k == 0 else row_strides[j][k-1]) // row_strides[j][k]
+            if n_values[var] > size:
+                raise ValueError("Parent {} of node {} can take {} categories, but the conditional probability "
+                                 "matrix of node {} has only {}.".format(var, j, n_values[var], j, size))
+    offsets = np.zeros(N + 1, dtype=np.intp)
+    offsets[1:] = np.cumsum([len(parents_order[j]) for j in range(N)])
+    lags = np.array([lag for j in range(N) for (lag, var) in parents_order[j]],
+                    dtype=np.intp)
+    parents = np.array([var for j in range(N)
+                        for (lag, var) in parents_order[j]], dtype=np.intp)
+    row_strides = np.array([stride for j in range(N)
+                            for stride in row_strides[j]], dtype=np.intp)
+    return (init_cum, init_offsets, cpm_cum, cpm_offsets, cpm_widths, offsets,
+            parents, lags, row_strides)
+
 def structural_causal_process_DBN(links, discrete, T, noises=None,
                         intervention=None, intervention_type='hard', 
                         fixed_prob=None,
-                        seed=None):
+                        seed=None, transient=None):
     """Returns a structural causal process with contemporaneous and lagged
     dependencies.
 
@@ -751,23 +1308,34 @@ def structural_causal_process_DBN(links, discrete, T, noises=None,
         Dictionary of format: {1:'hard',  3:'soft', ...} to specify whether intervention is
         hard (set value) or soft (add value) for variable j. If str, all interventions have
         the same type.
+    fixed_prob : array-like, optional (default: None)
+        Probabilities of the categories of each child, used for every parent
+        configuration of every conditional probability matrix instead of
+        drawing them at random. Normalized to sum to one.
     seed : int, optional (default: None)
         Random seed.
+    transient : int, optional (default: None)
+        Number of initial time steps that are sampled and discarded so that
+        the chain forgets its initial distribution. Defaults to
+        max(5*max_lag, 50), independent of T. Longer burn-ins cost more
+        samples but leave less dependence on the initial probabilities.
 
     Returns
     -------
     data : array-like
-        Data generated from this process, shape (T, N).
+        Data generated from this process, shape (T, N), of int32 categories.
     nonstationary : bool
         Indicates whether data has NaNs or infinities.
 
     """
     random_state = np.random.default_rng(seed)
     N = len(links.keys())
+    # Number of categories of each variable
+    n_cat = np.array([discrete[j] for j in range(N)], dtype=np.int32)
 
     # Check parameters
     max_lag = 0
-    contemp_dag = _Graph(N)
+    contemp_edges = []
     for j in range(N):
         for link_props in links[j]:
             # Discrete parents
@@ -777,16 +1345,17 @@ def structural_causal_process_DBN(links, discrete, T, noises=None,
                 raise ValueError("var must be in 0..{}.".format(N-1))
             if lag > 0 or type(lag) != int:
                 raise ValueError("lag must be non-positive int.")
+            if var == j and lag == 0:
+                raise ValueError("Node {} must not be its own contemporaneous parent.".format(j))
             max_lag = max(max_lag, abs(lag))
 
             # Create contemp DAG
             if var != j and lag == 0:
-                contemp_dag.addEdge(var, j)
+                contemp_edges.append((var, j))
 
-    if contemp_dag.isCyclic() == 1:
-        raise ValueError("Contemporaneous links must not contain cycle.")
-
-    causal_order = contemp_dag.topologicalSort()
+    # Typed array so that the order can be passed to _sample_dbn as is
+    contemp_csr = _edges_to_csr(N, contemp_edges)
+    causal_order = np.asarray(_kahn_toposort(*contemp_csr), dtype=np.int32)
 
     '''if intervention is not None:
         if intervention_type is None:
@@ -799,92 +1368,85 @@ def structural_causal_process_DBN(links, discrete, T, noises=None,
             if j not in intervention_type.keys():        
                 raise ValueError("intervention_type dictionary must contain entry for %s" %(j))'''
 
-    transient = int(math.floor(0.2*T))
+    if transient is None:
+        transient = max(5*max_lag, 50)
+    elif transient < 0 or type(transient) != int:
+        raise ValueError("transient must be non-negative int.")
 
     # prob is a 2xN multidimensional matrix. (1xN) for nodes upto max_lag (without parents) and (1xN) of
     # conditional probabilities for the rest of the nodes. The cpm for a N is assumed to be same over all the time
     # points
     prob = np.zeros((2, N), dtype='object')
-    # data (filled by drawing from a multinomial distribution from prob)
-    data = np.zeros((T + transient, N), dtype='object')
-    data[:] = np.nan
-    # Order of parents(ids) for each node. This is required to keep track the order to condition on while sampling from
-    # cpm
-    parents_order = np.zeros((T + transient, N), dtype='object')
+    # data (filled by drawing from a multinomial distribution from prob). Categories are non-negative, so -1 marks
+    # a value that has not been sampled yet
+    data = np.full((T + transient, N), -1, dtype=np.int32)
+    # Order of parents (lag, var) for each node. This is required to keep track the order to condition on while
+    # sampling from cpm and is the same for all time points
+    parents_order = {j: [(lag, var) for (var, lag) in links[j]] for j in range(N)}
 
     # Initial probabilities to use upto max_lag for each variable. The prob remains same upto max_lag for a variable
-    for j in range(N):
-        n_cat = discrete.get(j)
-        prob[0, j] = stochastic_matrix(random_state, n_cat)
-
-    # Conditional probabilities for all nodes > max_lag. cpm remains the same over all the time points for a variable
-    for t in range(max_lag, T+transient):
-        for j in causal_order:
-            # Interventions
-            '''if (intervention is not None and j in intervention and t >= transient
-                    and np.isnan(intervention[j][t - transient]) == False):
-                if intervention_type[j] == 'hard':
-                    data[t, j] = intervention[j][t - transient]
-                    continue
-                else:
-                    data[t, j] += intervention[j][t - transient]'''
-
-            # Number of categories of child - j
-            n_cat_j = discrete.get(j)
-            # all parents (var, lag) for a node at (t, j)
-            categories = []
-            parents_idx = []
-            for link_props in links[j]:
-                # var - parent, j - child
-                var, lag = link_props
-                parents_idx.append((t + lag, var))
-                # Number of categories of parent (var). Categories of var==(var, t+lag)
-                n_cat_var = discrete.get(var)
-                categories.append(n_cat_var)
-
-            # last element is the number of categories of child-j
-            categories.append(n_cat_j)
-            # Store parent's ids
-            parents_order[t, j] = parents_idx
-
-            # Conditional Probability Matrix (cpm) for each j with parents (vars, lags)
-            # The cpm is a ND matrix of size categories = [n_cat_var1, n_cat_var2,..., n_cat_j]
-            # If no parents, then categories = [n_cat_j] and cpm will be a stochastic array of size n_cat_j
-
-            # Create a zero matrix of size categories and then fill up over last axis(child) with stochastic array of
-            # size = n_cat_j
-            # cpm calculated only at one time point. Remains same across all the time points for a j
-            if t == max_lag:
-                cpm = np.zeros(categories, dtype='object')
-                # Fill in instances of stochastic matrix at the last axis, i.e axis of j
-                cpm = np.apply_along_axis(lambda x: stochastic_matrix(random_state, n_cat_j, fixed_prop=fixed_prob), axis=len(cpm.shape)-1,
-                                          arr=cpm)
-                prob[1, j] = cpm
+    for j, mat in enumerate(stochastic_matrices(random_state, n_cat)):
+        prob[0, j] = mat
+
+    # Conditional probabilities for all nodes > max_lag, built once per variable before sampling. cpm remains the
+    # same over all the time points for a variable
+    row_strides = {}
+    for j in causal_order:
+        # Number of categories of child - j
+        n_cat_j = n_cat[j]
+        # all parents (var, lag) for a node j
+        categories = []
+        for link_props in links[j]:
+            # var - parent, j - child
+            var, lag = link_props
+            # Number of categories of parent (var). Categories of var==(var, t+lag)
+            n_cat_var = n_cat[var]
+            categories.append(n_cat_var)
+
+        # last element is the number of categories of child-j
+        categories.append(n_cat_j)
+
+        # Conditional Probability Matrix (cpm) for each j with parents (vars, lags)
+        # The cpm is a ND matrix of size categories = [n_cat_var1, n_cat_var2,..., n_cat_j]
+        # If no parents, then categories = [n_cat_j] and cpm will be a stochastic array of size n_cat_j
+
+        # Fill a float matrix of size categories with stochastic arrays of size = n_cat_j over the last axis(child)
+        # cpm calculated only once. Remains same across all the time points for a j
+        if not parents_order[j]:
+            cpm = stochastic_matrix(random_state, n_cat_j, fixed_prob)
+        elif fixed_prob is None:
+            cpm = random_state.random(categories)
+            cpm /= cpm.sum(axis=-1, keepdims=True)
+        else:
+            cpm = np.broadcast_to(stochastic_matrix(random_state, n_cat_j, fixed_prob), categories).copy()
+        # Stored with one row per parent configuration
+        prob[1, j], row_strides[j] = _cpm_to_rows(cpm)
 
     # Sampling
-    for t in range(T + transient):
-        for j in causal_order:
-            if data[t, j] is np.nan:
-                if t < max_lag:
-                    draw = random_state.multinomial(1, pvals=prob[0, j], size=1)[0]
-                    data[t, j] = np.where(draw == 1)[0][0]
-                else:
-                    parents = []
-                    for p in parents_order[t, j]:
-                        parents.append(data[p])
-                    conditioned_cpm = prob[1, j][tuple(parents)]
-                    draw = random_state.multinomial(1, pvals=conditioned_cpm, size=1)[0]
-                    data[t, j] = np.where(draw == 1)[0][0]
-            else:
-                raise ValueError("Causal order not traversed")
+    # One uniform number per cell, drawn in a single call
+    U = random_state.random((T + transient, N))
+    tables = _pack_dbn_tables(prob, parents_order, row_strides, n_cat)
+    causal_order = _sample_dbn_roots(data, max_lag, causal_order, n_cat, *tables, U)
+    # Nodes of the same level of the contemporaneous graph can be sampled in parallel. Every level starts a parallel
+    # region at each time step, which only pays off for wide levels.
+    levels = []
+    if get_num_threads() > 1:
+        remaining = set(causal_order.tolist())
+        levels = [[j for j in level if j in remaining] for level in _toposort_levels(*contemp_csr)]
+        levels = [level for level in levels if level]
+    if levels and max(len(level) for level in levels) >= 256:
+        _sample_dbn_parallel(data, max_lag, np.cumsum([0] + [len(level) for level in levels]),
+                             np.array([j for level in levels for j in level], dtype=np.intp), n_cat, *tables, U)
+    else:
+        _sample_dbn(data, max_lag, causal_order, n_cat, *tables, U)
 
-    data = data[transient:].astype(int)
+    data = data[transient:]
 
     #nonstationary = (np.any(np.isnan(data)) or np.any(np.isinf(data)))
     return data
 
 def structural_causal_process_DBN_linkstrength(links, discrete, T, n_symbs, intervention=None, intervention_type='hard',
-                        seed_p=None, seed_s=None):
+                        seed_p=None, seed_s=None, transient=None):
     """Returns a Dynamic Bayesian Network (with link strength) as a structural causal process with contemporaneous and
     lagged dependencies.
 
@@ -907,20 +1469,27 @@ def structural_causal_process_DBN_linkstrength(links, discrete, T, n_symbs, inte
         Random seed for CPT generation.
     seed_s : int, optional (default: None)
         Random seed for sampling from the Bayesian Network.
+    transient : int, optional (default: None)
+        Number of initial time steps that are sampled and discarded so that
+        the chain forgets its initial distribution. Defaults to
+        max(5*max_lag, 50), independent of T. Longer burn-ins cost more
+        samples but leave less dependence on the initial probabilities.
 
     Returns
     -------
     data : array-like
-        Data generated from this process, shape (T, N).
+        Data generated from this process, shape (T, N), of int32 categories.
 
     """
     random_state_prob = np.random.default_rng(seed_p)
     random_state_sample = np.random.default_rng(seed_s)
     N = len(links.keys())
+    # Number of categories of each variable
+    n_cat = np.array([discrete[j] for j in range(N)], dtype=np.int32)
 
     # Check parameters
     max_lag = 0
-    contemp_dag = _Graph(N)
+    contemp_edges = []
     for j in range(N):
         for link_props in links[j]:
             # Discrete parents
@@ -931,18 +1500,19 @@ def structural_causal_process_DBN_linkstrength(links, discrete, T, n_symbs, inte
                 raise ValueError("var must be in 0..{}.".format(N-1))
             if lag > 0 or type(lag) != int:
                 raise ValueError("lag must be non-positive int.")
+            if var == j and lag == 0:
+                raise ValueError("Node {} must not be its own contemporaneous parent.".format(j))
             if (0 > eta) or (eta > 1):
                 raise ValueError("eta must be within [0, 1]")
             max_lag = max(max_lag, abs(lag))
 
             # Create contemp DAG
             if var != j and lag == 0:
-                contemp_dag.addEdge(var, j)
-
-    if contemp_dag.isCyclic() == 1:
-        raise ValueError("Contemporaneous links must not contain cycle.")
+                contemp_edges.append((var, j))
 
-    causal_order = contemp_dag.topologicalSort()
+    # Typed array so that the order can be passed to _sample_dbn as is
+    contemp_csr = _edges_to_csr(N, contemp_edges)
+    causal_order = np.asarray(_kahn_toposort(*contemp_csr), dtype=np.int32)
 
     '''if intervention is not None:
         if intervention_type is None:
@@ -955,87 +1525,75 @@ def structural_causal_process_DBN_linkstrength(links, discrete, T, n_symbs, inte
             if j not in intervention_type.keys():        
                 raise ValueError("intervention_type dictionary must contain entry for %s" %(j))'''
 
-    transient = int(math.floor(0.2*T))
+    if transient is None:
+        transient = max(5*max_lag, 50)
+    elif transient < 0 or type(transient) != int:
+        raise ValueError("transient must be non-negative int.")
 
     # prob is a 2xN multidimensional matrix. (1xN) for nodes upto max_lag (without parents) and (1xN) of
     # conditional probabilities for the rest of the nodes. The cpm for a j in N is assumed to be same over all the time
     # points (stationarity assumption).
     prob = np.zeros((2, N), dtype='object')
-    # data (filled by drawing from a multinomial distribution from prob)
-    data = np.zeros((T + transient, N), dtype='object')
-    data[:] = np.nan
-    # Order of parents(ids) for each node. This is required to keep track the order to condition on while sampling from
-    # cpm
-    parents_order = np.zeros((T + transient, N), dtype='object')
+    # data (filled by drawing from a multinomial distribution from prob). Categories are non-negative, so -1 marks
+    # a value that has not been sampled yet
+    data = np.full((T + transient, N), -1, dtype=np.int32)
+    # Order of parents (lag, var) for each node. This is required to keep track the order to condition on while
+    # sampling from cpm and is the same for all time points
+    parents_order = {j: [(lag, var) for (var, lag) in (link_props[0] for link_props in links[j])] for j in range(N)}
 
     # Initial probabilities to use upto max_lag for each variable. The prob remains same upto max_lag for a variable
-    for j in range(N):
-        n_cat = discrete.get(j)
-        prob[0, j] = stochastic_matrix(random_state_prob, n_cat)
-
-    # Conditional probabilities for all nodes > max_lag. cpm remains the same over all the time points for a variable
-    for t in range(max_lag, T+transient):
-        for j in causal_order:
-            # Interventions
-            '''if (intervention is not None and j in intervention and t >= transient
-                    and np.isnan(intervention[j][t - transient]) == False):
-                if intervention_type[j] == 'hard':
-                    data[t, j] = intervention[j][t - transient]
-                    continue
-                else:
-                    data[t, j] += intervention[j][t - transient]'''
-
-            # Number of categories of child - j
-            n_cat_j = discrete.get(j)
-            # all parents (var, lag) for a node at (t, j)
-            parents_idx = []
-            categories = []
-            etas = []
-            for link_props in links[j]:
-                # var - parent, j - child
-                var, lag = link_props[0]
-                eta = link_props[1]
-                parents_idx.append((t + lag, var))
-                etas.append(eta)
-                # Number of categories of parent (var). Categories of var==(var, t+lag)
-                n_cat_var = discrete.get(var)
-                categories.append(n_cat_var)
-
-            # Add last element as the number of categories of child-j
-            categories.append(n_cat_j)
-            # Store parent's ids
-            parents_order[t, j] = parents_idx
-
-            # Conditional Probability Matrix (cpm) for each j with parents (vars, lags, eta)
-            # The cpm is a ND matrix of size categories = [n_cat_var1, n_cat_var2,..., n_cat_j]
-            # If no parents, then categories = [n_cat_j] and cpm will be a stochastic array of size n_cat_j
-            # cpm calculated only at one time point. Remains same across all the time points for a j
-            if t == max_lag:
-                if not parents_idx:
-                    cpm = stochastic_matrix(random_state_prob, n_cat_j)
-                else:
-                    cpm = gen_cpt(len(parents_idx), np.arange(n_symbs), np.array(etas))
-                prob[1, j] = cpm
+    for j, mat in enumerate(stochastic_matrices(random_state_prob, n_cat)):
+        prob[0, j] = mat
+
+    # Conditional probabilities for all nodes > max_lag, built once per variable before sampling. cpm remains the
+    # same over all the time points for a variable
+    row_strides = {}
+    for j in causal_order:
+        # Number of categories of child - j
+        n_cat_j = n_cat[j]
+        # all parents (var, lag) for a node j
+        categories = []
+        etas = np.array([link_props[1] for link_props in links[j]], dtype=np.float64)
+        for link_props in links[j]:
+            # var - parent, j - child
+            var, lag = link_props[0]
+            # Number of categories of parent (var). Categories of var==(var, t+lag)
+            n_cat_var = n_cat[var]
+            categories.append(n_cat_var)
+
+        # Add last element as the number of categories of child-j
+        categories.append(n_cat_j)
+
+        # Conditional Probability Matrix (cpm) for each j with parents (vars, lags, eta)
+        # The cpm is a ND matrix of size categories = [n_cat_var1, n_cat_var2,..., n_cat_j]
+        # If no parents, then categories = [n_cat_j] and cpm will be a stochastic array of size n_cat_j
+        # cpm calculated only once. Remains same across all the time points for a j
+        if not parents_order[j]:
+            cpm = stochastic_matrix(random_state_prob, n_cat_j)
+        else:
+            cpm = gen_cpt(len(parents_order[j]), np.arange(n_symbs), etas)
+        # Stored with one row per parent configuration
+        prob[1, j], row_strides[j] = _cpm_to_rows(cpm)
 
     # Sampling
-    for t in range(T + transient):
-        for j in causal_order:
-            if data[t, j] is np.nan:
-                if t < max_lag:
-                    # Draw a category from multiple categories based on prob.
-                    draw = random_state_sample.multinomial(1, pvals=prob[0, j], size=1)[0]
-                    data[t, j] = np.where(draw == 1)[0][0]
-                else:
-                    parents = []
-                    for p in parents_order[t, j]:
-                        parents.append(data[p])
-                    conditioned_cpm = prob[1, j][tuple(parents)]
-                    draw = random_state_sample.multinomial(1, pvals=conditioned_cpm, size=1)[0]
-                    data[t, j] = np.where(draw == 1)[0][0]
-            else:
-                raise ValueError("Causal order not traversed")
+    # One uniform number per cell, drawn in a single call
+    U = random_state_sample.random((T + transient, N))
+    tables = _pack_dbn_tables(prob, parents_order, row_strides, n_cat)
+    causal_order = _sample_dbn_roots(data, max_lag, causal_order, n_cat, *tables, U)
+    # Nodes of the same level of the contemporaneous graph can be sampled in parallel. Every level starts a parallel
+    # region at each time step, which only pays off for wide levels.
+    levels = []
+    if get_num_threads() > 1:
+        remaining = set(causal_order.tolist())
+        levels = [[j for j in level if j in remaining] for level in _toposort_levels(*contemp_csr)]
+        levels = [level for level in levels if level]
+    if levels and max(len(level) for level in levels) >= 256:
+        _sample_dbn_parallel(data, max_lag, np.cumsum([0] + [len(level) for level in levels]),
+                             np.array([j for level in levels for j in level], dtype=np.intp), n_cat, *tables, U)
+    else:
+        _sample_dbn(data, max_lag, causal_order, n_cat, *tables, U)
 
-    data = data[transient:].astype(int)
+    data = data[transient:]
     return data
 
 
@@ -1052,63 +1610,68 @@ def gen_cpt(nparents, var_states, eta):
     # P(ui'|ui)
     def P_uid_ui(m, eta):
         P = np.zeros((m, m))
-        for r in range(m):
-            for c in range(m):
-                if r == c:
-                    P[r, c] = (1 / m) + (eta * (1 - (1 / m)))
-
-                else:
-                    P[r, c] = (1 / (m - 1)) * (1 - (1 / m) - (eta * (1 - (1 / m))))
+        # Off-diagonal entries share the remaining probability mass (there are none for m = 1)
+        if m > 1:
+            P[:] = (1 / (m - 1)) * (1 - (1 / m) - (eta * (1 - (1 / m))))
+        np.fill_diagonal(P, (1 / m) + (eta * (1 - (1 / m))))
         return P
 
-    # x=F(u')
-    def F(x, ud, eta):
-        abs_eta = abs(eta)
-        j_ = int(np.around(np.sum(np.multiply(abs_eta, ud)) / np.sum(abs_eta)))
-        return x[j_-1]
-
     m = len(states)
-    states = np.arange(m)+1
 
-    x = np.copy(states)
     # Setup P_uid_ui(m, eta) for each parent (No child required).
     P_ud_u = np.zeros((nparents), dtype='object')
     for k in range(nparents):
         P_ud_u[k] = P_uid_ui(m, eta[k])
 
-    # Permutation set of all configurations of u and ud in the order [u1,u1d, u2,u2d, u3,u3d...]
-    perm_states = np.array(list(itertools.product(states, repeat=nparents * 2)))
+    # Permutation set of all configurations of u and ud in the order [u1,u1d, u2,u2d, u3,u3d...], with states 1..m.
+    # Configuration i has the base m digits of i as states, in the same order as itertools.product
+    perm_index = np.arange(pow(m, nparents * 2))
+    perm_states = perm_index[:, None] // (m ** np.arange(nparents * 2 - 1, -1, -1)) % m + 1
     # Splits into parent subarray configs [u1,u1d], [u2,u2d], [u3,u3d]
     parents = np.array(np.split(perm_states, nparents, axis=1))
 
     # x = m states, u=pow(m, nparents) state permutations
     P_x_u = np.zeros((pow(m, nparents), m))
-    # State permutations of u
-    u_states = np.array(list(itertools.product(states, repeat=nparents)))
 
-    # For each perm in perm_states(u and ud)
-    for i in range(len(perm_states)):
-        x_state = F(x, parents[:, i, 1], eta)
-        x_state -= 1
-        u_state_index = np.where((u_states == parents[:, i, 0]).all(axis=1))[0][0]
+    # x=F(u') for all perms in perm_states(u and ud) at once, i.e. the state closest to the eta weighted mean of ud
+    abs_eta = np.abs(eta)
+    if not abs_eta.sum() > 0:
+        raise ValueError("eta must be nonzero for at least one parent")
+    x_states = np.around((abs_eta[:, None] * parents[:, :, 1]).sum(axis=0) / abs_eta.sum()).astype(int) - 1
+    # Row of u in the state permutations of u, read as a base m number
+    u_state_indices = (m ** np.arange(nparents - 1, -1, -1)) @ (parents[:, :, 0] - 1)
 
-        product_prob = 1.0
-        for j in range(nparents):
-            product_prob *= P_ud_u[j][(parents[j, i, 1]-1, parents[j, i, 0]-1)]
+    product_probs = np.ones(len(perm_states))
+    for j in range(nparents):
+        product_probs *= P_ud_u[j][parents[j, :, 1]-1, parents[j, :, 0]-1]
 
-        P_x_u[u_state_index, x_state] += product_prob
-        if P_x_u[u_state_index, x_state] > 1.0:
-            P_x_u[u_state_index, x_state] = 1.0
+    # Accumulate in the order of perm_states. All terms are non-negative, so clipping once at the end is the same
+    # as clipping after every addition
+    np.add.at(P_x_u, (u_state_indices, x_states), product_probs)
+    np.minimum(P_x_u, 1.0, out=P_x_u)
 
     # Reshape array compatible with conditional probability matrix size = [n_cat_var1, n_cat_var2, n_cat_var3, n_cat_j]
     P_x_u = P_x_u.reshape([m] * (nparents+1))
     return P_x_u
 
-def stochastic_matrix(random_state, n_categories):
-    mat = random_state.random(n_categories)
+def stochastic_matrix(random_state, n_categories, fixed_prob=None):
+    if fixed_prob is not None:
+        mat = np.array(fixed_prob, dtype=np.float64)
+        if mat.shape != (n_categories,):
+            raise ValueError("fixed_prob must have one entry per category (%d)" % n_categories)
+    else:
+        mat = random_state.random(n_categories)
     mat /= mat.sum()
     return mat
 
+def stochastic_matrices(random_state, n_categories):
+    """Returns one stochastic array of size n_categories[j] for each j, drawn in a single call to random_state. Same
+    values as calling stochastic_matrix for each j in turn."""
+    mats = np.split(random_state.random(int(np.sum(n_categories))), np.cumsum(n_categories)[:-1])
+    for mat in mats:
+        mat /= mat.sum()
+    return mats
+
 def _get_minmax_lag(links):
     """Helper function to retrieve tau_min and tau_max from links.
     """